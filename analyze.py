@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+# Rank played-back games by the size of the output they produce, without
+# producing it: the games are replayed headless in a process pool, counting
+# the boards that freecell-game.py -p would print. (This replaces running
+# the game for each one and measuring its output with wc.)
+
+import getopt
+import re
+import sys
+
+from games import Games, open_games
+from replay import replay_games
+
+# Read the game numbers from a log with a game on each line, e.g.
+# "*** Failed Game #29596 ***" or "FAILED GAME 29596".
+
+def read_games_log(filename):
+    games = []
+    for line in open(filename):
+        game_no = re.search(r'(?i)game\s*#?(\d+)', line)
+        if game_no:
+            games.append(int(game_no.group(1)))
+    return games
+
+def describe_failure(result):
+    if result.completed:
+        return 'completed'
+    if result.completed is None:
+        return 'quit'
+    if result.failed_move:
+        number, move = result.failed_move
+        return f'failed at move {number} ({move})'
+    return 'ran out of moves'
+
+def usage():
+    print(f'''\nusage: {sys.argv[0]} [options] [games log]
+
+Replay games headless and rank them by the number of boards playing them back prints (largest first),
+reporting their user moves, automoves and where they failed. Without a games log (such as one listing
+failed games) all the games in the moves file that fail are ranked.
+
+    Options:
+       -M or --moves-file <file> - load moves from given file (default "{Games.default_file}")
+       -j or --jobs n - set the number of processes (default: one per CPU)
+       -h or --help - print this help sheet
+''')
+    sys.exit(1)
+
+def main():
+    moves_file = Games.default_file
+    jobs = None
+    try:
+        optslist, args = getopt.getopt(sys.argv[1:], 'M:j:h', ['moves-file=', 'jobs=', 'help'])
+    except getopt.GetoptError as err:
+        print(f'\n*** {err} ***\n')
+        usage()
+
+    for arg, val in optslist:
+        if arg in ('--moves-file', '-M'):
+            moves_file = val
+        elif arg in ('--jobs', '-j'):
+            jobs = int(val)
+        elif arg in ('--help', '-h'):
+            usage()
+
+    if len(args) > 1:
+        usage()
+
+    solved_games = open_games(moves_file)
+    seeds = read_games_log(args[0]) if args else list(solved_games)
+    missing = [i for i in seeds if i not in solved_games]
+    if missing:
+        print(f'*** Games not in "{moves_file}": {", ".join(str(i) for i in missing)} ***', file=sys.stderr)
+
+    results = replay_games(((i, solved_games[i]) for i in seeds if i in solved_games), jobs=jobs)
+    if not args:
+        results = (i for i in results if i.completed is False)
+
+    print(f'{"game":>10} {"boards":>7} {"moves":>6} {"automoves":>9}  result')
+    for result in sorted(results, key=lambda i: i.boards, reverse=True):
+        print(f'{result.seed:10} {result.boards:7} {result.moves:6} {result.automoves:9}  {describe_failure(result)}')
+
+if __name__ == '__main__':
+    main()
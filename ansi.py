@@ -31,3 +31,9 @@ class bg:
 	purple='\033[45m'
 	cyan='\033[46m'
 	lightgrey='\033[47m'
+# cursor control (rows and columns count from 1)
+clear='\033[2J'
+erase_line='\033[K'
+erase_below='\033[J'
+def move_to(row, col):
+	return f'\033[{row};{col}H'
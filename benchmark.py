@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+# Benchmarks for the Freecell engine's hot paths. Results are written to a
+# JSON file and compared against a saved baseline to show regressions.
+
+import contextlib
+import getopt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from deals import get_deals
+from freecell import Board, GetShuffledDeck, Random, UserException
+from games import Games
+from replay import play_moves
+
+# Each benchmark function sets up its work and returns a function that does it,
+# along with the number of operations that function performs.
+
+Benchmarks = {}
+
+def benchmark(function):
+    Benchmarks[function.__name__] = function
+    return function
+
+Seeds = range(1, 1001)
+
+@benchmark
+def deal_generation():
+    return lambda: [list(GetShuffledDeck(seed)) for seed in Seeds], len(Seeds)
+
+@benchmark
+def bulk_deal_generation():
+    return lambda: get_deals(Seeds), len(Seeds)
+
+@benchmark
+def random_numbers():
+    def run():
+        for seed in Seeds:
+            rand = Random(seed)
+            for i in range(52):
+                rand.random()
+    return run, len(Seeds) * 52
+
+@benchmark
+def board_construction():
+    return lambda: [Board(seed=seed) for seed in Seeds], len(Seeds)
+
+# Realistic positions: the solved games part of the way through, snapshotted
+# before and after the automover has run.
+
+def get_positions(fraction=0.5):
+    before_automoves, after_automoves = [], []
+    games = Games()
+    for seed in games:
+        board = Board(seed=seed)
+        moves = games[seed][:int(len(games[seed]) * fraction)]
+        try:
+            for move in moves:
+                board.perform_move(move, make_checkpoint=True)
+                before_automoves.append(board.snapshot())
+                for automove in board.automatic_moves():
+                    board.perform_move(automove, make_checkpoint=False)
+        except UserException:
+            continue
+        after_automoves.append(board.snapshot())
+    return before_automoves, after_automoves
+
+@benchmark
+def get_possible_moves():
+    positions = [Board.from_snapshot(i) for i in get_positions()[1]]
+    def run():
+        for board in positions:
+            list(board.get_possible_moves())
+    # Forget the legal moves found, so each run finds them all.
+    def reset():
+        for board in positions:
+            board.legal_moves = None
+    return run, len(positions), reset
+
+# Finding the moves again after a move, as the -A option does, which only
+# needs the moves of the move's columns found again.
+
+@benchmark
+def get_possible_moves_after_move():
+    positions = [Board.from_snapshot(i) for i in get_positions()[1]]
+    moves = []
+    for board in positions:
+        move = next(board.get_possible_moves(), None)
+        moves.append(move and board.get_move_code(move))
+    def run():
+        for board, move in zip(positions, moves):
+            token = move is not None and board.apply(move)
+            list(board.get_possible_moves())
+            if token:
+                board.revert(token)
+    return run, len(positions)
+
+@benchmark
+def automatic_moves():
+    snapshots = get_positions()[0]
+    positions = [Board.from_snapshot(i) for i in snapshots]
+    def run():
+        for board in positions:
+            for move in board.automatic_moves():
+                board.perform_move(move, make_checkpoint=False)
+    # Put the positions back after each run, outside of the timing.
+    def reset():
+        for board, snapshot in zip(positions, snapshots):
+            board.restore(snapshot)
+    return run, len(positions), reset
+
+@benchmark
+def snapshot_round_trip():
+    positions = [Board.from_snapshot(i) for i in get_positions()[1]]
+    def run():
+        for board in positions:
+            board.restore(board.snapshot())
+    return run, len(positions)
+
+@benchmark
+def replay_headless():
+    games = Games()
+    def run():
+        for seed in games:
+            play_moves(Board(seed=seed), games[seed], automoves=True)
+    return run, len(games)
+
+@benchmark
+def replay_printed():
+    games = Games()
+    def run():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for seed in games:
+                play_moves(PrintingBoard(seed=seed), games[seed], automoves=True)
+    return run, len(games)
+
+# A board that prints itself after every move, as the game does.
+
+class PrintingBoard(Board):
+    def __init__(self, seed):
+        Board.__init__(self, seed=seed)
+        self.print()
+
+    def perform_move(self, move, make_checkpoint):
+        Board.perform_move(self, move, make_checkpoint)
+        self.print()
+
+# Start-up times of freecell-game.py, printing its help sheet and
+# starting (and quitting) a game.
+
+Startup_runs = 10
+
+def run_freecell_game(*args, input=''):
+    program = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'freecell-game.py')
+    for i in range(Startup_runs):
+        subprocess.run([sys.executable, program] + list(args), input=input, text=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+@benchmark
+def startup_help():
+    return lambda: run_freecell_game('--help'), Startup_runs
+
+@benchmark
+def startup_game():
+    return lambda: run_freecell_game('-g', '1', input='q\n'), Startup_runs
+
+# Run a benchmark, keeping the best time of several repeats.
+
+def run_benchmark(name, repeats):
+    setup = Benchmarks[name]()
+    run, operations = setup[:2]
+    reset = setup[2] if len(setup) > 2 else None
+
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        if reset:
+            reset()
+
+    best = min(times)
+    return dict(seconds=best, operations=operations, microseconds_per_operation=best / operations * 1e6)
+
+# Compare the results against the baseline's, returning the names of
+# the benchmarks that got slower by more than the threshold.
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f'\n{"benchmark":24} {"us/op":>12} {"baseline":>12} {"change":>8}')
+    for name, result in results.items():
+        now = result['microseconds_per_operation']
+        before = baseline.get(name, {}).get('microseconds_per_operation')
+        if before is None:
+            print(f'{name:24} {now:12.2f} {"-":>12} {"-":>8}')
+            continue
+        change = now / before - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:24} {now:12.2f} {before:12.2f} {change:+8.1%}{flag}')
+    return regressions
+
+def usage():
+    print(f'''\nusage: {sys.argv[0]} [options] [benchmark...]
+
+Time the Freecell engine's hot paths and compare the results against a baseline.
+
+    Benchmarks: {', '.join(Benchmarks)}
+
+    Options:
+       -o or --output <file> - write the results to file (default: "benchmark.json")
+       -b or --baseline <file> - compare against the results in file (default: "benchmark_baseline.json")
+       -s or --save-baseline - also save the results as the new baseline
+       -r or --repeats n - keep the best of n runs of each benchmark (default: 3)
+       -t or --threshold n - report slowdowns of more than n percent as regressions (default: 10)
+       -h or --help - print this help sheet
+''')
+    sys.exit(1)
+
+def main():
+    output = 'benchmark.json'
+    baseline_file = 'benchmark_baseline.json'
+    save_baseline = False
+    repeats = 3
+    threshold = 0.10
+
+    try:
+        optslist, names = getopt.getopt(sys.argv[1:], 'o:b:sr:t:h',
+                ['output=', 'baseline=', 'save-baseline', 'repeats=', 'threshold=', 'help'])
+    except getopt.GetoptError as err:
+        print(f'\n*** {err} ***\n')
+        usage()
+
+    for arg, val in optslist:
+        if arg in ('--output', '-o'):
+            output = val
+        elif arg in ('--baseline', '-b'):
+            baseline_file = val
+        elif arg in ('--save-baseline', '-s'):
+            save_baseline = True
+        elif arg in ('--repeats', '-r'):
+            repeats = int(val)
+        elif arg in ('--threshold', '-t'):
+            threshold = float(val) / 100
+        elif arg in ('--help', '-h'):
+            usage()
+
+    for name in names:
+        if name not in Benchmarks:
+            print(f'*** No such benchmark "{name}" ***')
+            usage()
+
+    results = {}
+    for name in names or Benchmarks:
+        results[name] = run_benchmark(name, repeats)
+        print(f'{name}: {results[name]["seconds"]:.3f}s for {results[name]["operations"]} operations',
+              file=sys.stderr)
+
+    report = dict(python=platform.python_version(), machine=platform.machine(), results=results)
+    with open(output, 'w') as fd:
+        json.dump(report, fd, indent=2)
+
+    baseline = {}
+    if os.path.exists(baseline_file):
+        baseline = json.load(open(baseline_file))['results']
+    elif not save_baseline:
+        print(f'No baseline file "{baseline_file}" to compare against (use --save-baseline)')
+
+    # Saving only some of the benchmarks keeps the baseline's other results.
+    if save_baseline:
+        with open(baseline_file, 'w') as fd:
+            json.dump(dict(report, results=dict(baseline, **results)), fd, indent=2)
+
+    regressions = compare(results, baseline, threshold)
+    if regressions:
+        print(f'\n*** {len(regressions)} regression(s): {", ".join(regressions)} ***')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
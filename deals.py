@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Bulk generation of MS compatible Freecell deals. A deal is the 52 card
+# numbers in the order GetShuffledDeck yields them (and Board deals them out).
+# With NumPy available the MS LCG runs across all of the seeds at once.
+
+import hashlib
+import mmap
+import struct
+import sys
+
+from freecell import DECK_SIZE, Card, GameException, GetShuffledDeck, Random, UserException
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Return the deals for the given seeds: an array of shape (seeds, 52) when
+# NumPy is available, otherwise a list of 52 byte bytes objects.
+
+def get_deals(seeds):
+    if numpy is None:
+        return [get_deal(seed) for seed in seeds]
+
+    state = numpy.array(seeds, dtype=numpy.uint64)
+    rows = numpy.arange(len(state))
+    decks = numpy.tile(numpy.arange(DECK_SIZE, dtype=numpy.uint8), (len(state), 1))
+    deals = numpy.empty((len(state), DECK_SIZE), dtype=numpy.uint8)
+
+    # Each step deals a card from each deck, moving the deck's last card into its place.
+    for i in range(DECK_SIZE):
+        left = DECK_SIZE - i
+        state = (state * Random.Multiplier + Random.Increment) % Random.Modulus
+        idx = (state >> Random.Output_shift) % left
+        deals[:, i] = decks[rows, idx]
+        decks[rows, idx] = decks[:, left - 1]
+
+    return deals
+
+# A single deal, without building Card objects or Random instances.
+
+def get_deal(seed):
+    deck = list(range(DECK_SIZE))
+    deal = bytearray()
+    for left in range(DECK_SIZE, 0, -1):
+        seed = (seed * Random.Multiplier + Random.Increment) % Random.Modulus
+        idx = (seed >> Random.Output_shift) % left
+        deal.append(deck[idx])
+        deck[idx] = deck[left - 1]
+    return bytes(deal)
+
+# Check the bulk deals against GetShuffledDeck card for card,
+# returning the seeds whose deals don't match.
+
+def check_deals(seeds):
+    seeds = list(seeds)
+    return [seed for seed, deal in zip(seeds, get_deals(seeds))
+            if list(deal) != [card.number for card in GetShuffledDeck(seed)]]
+
+# A DealStore is a file of the deals for a range of seeds, opened with mmap, so 
+# reading the deal for a seed is a slice. It has a fingerprint index (an open 
+# addressing hash table) mapping deals back to their seeds. The file layout is:
+#   header: magic, first seed, seed count, index slot count
+#   deals:  52 bytes (card numbers) for each seed in turn
+#   index:  slots of (deal fingerprint, seed - first seed); a fingerprint of 0 is an empty slot
+
+class DealStore:
+    Magic = b'FCDEALS1'
+    Header = struct.Struct('<8sQQQ')
+    Slot = struct.Struct('<QI')
+    Chunk_size = 100000 # seeds dealt at a time when building
+
+    def __init__(self, filename):
+        self.fd = open(filename, 'rb')
+        self.data = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.first_seed, self.count, self.slots = DealStore.Header.unpack_from(self.data)
+        if magic != DealStore.Magic:
+            raise GameException(f'"{filename}" is not a deal store')
+        self.index_start = DealStore.Header.size + self.count * DECK_SIZE
+
+    @staticmethod
+    def build(filename, first_seed, count):
+        slots = 1 << (2 * count).bit_length() # keep the table at most half full
+        index = bytearray(slots * DealStore.Slot.size)
+        with open(filename, 'wb') as fd:
+            fd.write(DealStore.Header.pack(DealStore.Magic, first_seed, count, slots))
+            for start in range(0, count, DealStore.Chunk_size):
+                seeds = range(first_seed + start, first_seed + min(count, start + DealStore.Chunk_size))
+                for offset, deal in enumerate(get_deals(seeds), start):
+                    deal = bytes(deal)
+                    fd.write(deal)
+                    fingerprint = get_fingerprint(deal)
+                    slot = get_free_slot(index, fingerprint, slots)
+                    DealStore.Slot.pack_into(index, slot * DealStore.Slot.size, fingerprint, offset)
+            fd.write(index)
+        return DealStore(filename)
+
+    def close(self):
+        self.data.close()
+        self.fd.close()
+
+    # The deal (as bytes of card numbers) for a seed, or None if it's not in the store.
+    def get_deal(self, seed):
+        offset = seed - self.first_seed
+        if 0 <= offset < self.count:
+            start = DealStore.Header.size + offset * DECK_SIZE
+            return self.data[start:start + DECK_SIZE]
+
+    # The seed of a deal (given as card numbers), or None if it's not in the store.
+    def find_seed(self, deal):
+        deal = bytes(deal)
+        fingerprint = get_fingerprint(deal)
+        slot = fingerprint & (self.slots - 1)
+        while True:
+            slot_fingerprint, offset = DealStore.Slot.unpack_from(self.data, self.index_start + slot * DealStore.Slot.size)
+            if slot_fingerprint == 0:
+                return None
+            if slot_fingerprint == fingerprint and self.get_deal(self.first_seed + offset) == deal:
+                return self.first_seed + offset
+            slot = (slot + 1) & (self.slots - 1)
+
+# A 64 bit fingerprint of a deal, never 0 (which marks empty index slots).
+
+def get_fingerprint(deal):
+    return int.from_bytes(hashlib.blake2b(deal, digest_size=8).digest(), 'little') or 1
+
+def get_free_slot(index, fingerprint, slots):
+    slot = fingerprint & (slots - 1)
+    while DealStore.Slot.unpack_from(index, slot * DealStore.Slot.size)[0]:
+        slot = (slot + 1) & (slots - 1)
+    return slot
+
+# Cards are written as a rank and a suit letter or glyph, e.g. "TH" or "T♥".
+# Listing a board's starting cascades row by row gives its deal.
+
+def parse_cards(names):
+    numbers = []
+    for name in names:
+        if len(name) != 2 or name[0] not in Card.Ranks or name[1] not in Card.Suits + Card.Glyphs:
+            raise UserException(f'"{name}" is not a card')
+        suit = (Card.Suits + Card.Glyphs).index(name[1]) % len(Card.Suits)
+        numbers.append(Card.Ranks.index(name[0]) * len(Card.Suits) + suit)
+    return numbers
+
+def format_cards(deal):
+    return ' '.join(Card.Ranks[i // 4] + Card.Suits[i % 4] for i in deal)
+
+def usage():
+    print(f'''\nusage: {sys.argv[0]} command [arguments]
+
+Generate MS compatible Freecell deals in bulk.
+
+    Commands:
+       check first count - check the deals for seeds first..first+count-1 against GetShuffledDeck
+       build <file> first count - write a deal store for seeds first..first+count-1
+       deal <file> seed - print the deal for a seed from a deal store
+       seed <file> card... - find the seed of a deal, given as its 52 cards in deal order
+          (the starting cascades read row by row, e.g. "JD 2D 9H JC ...")
+''')
+    sys.exit(1)
+
+def main():
+    args = sys.argv[1:]
+    if len(args) == 3 and args[0] == 'check':
+        first, count = int(args[1]), int(args[2])
+        failures = check_deals(range(first, first + count))
+        print(f'{count - len(failures)} of {count} deals match GetShuffledDeck')
+        if failures:
+            print(f'*** Mismatched seeds: {", ".join(str(i) for i in failures[:20])} ***')
+            sys.exit(1)
+    elif len(args) == 4 and args[0] == 'build':
+        store = DealStore.build(args[1], int(args[2]), int(args[3]))
+        print(f'Wrote the deals for seeds {store.first_seed}-{store.first_seed + store.count - 1} to "{args[1]}"')
+    elif len(args) == 3 and args[0] == 'deal':
+        deal = DealStore(args[1]).get_deal(int(args[2]))
+        if deal is None:
+            print(f'*** Seed {args[2]} is not in "{args[1]}" ***')
+            sys.exit(1)
+        print(format_cards(deal))
+    elif len(args) == DECK_SIZE + 2 and args[0] == 'seed':
+        try:
+            seed = DealStore(args[1]).find_seed(parse_cards(args[2:]))
+        except UserException as e:
+            print(f'*** {e} ***')
+            sys.exit(1)
+        if seed is None:
+            print(f'*** That deal is not in "{args[1]}" ***')
+            sys.exit(1)
+        print(seed)
+    else:
+        usage()
+
+if __name__ == '__main__':
+    main()
@@ -5,17 +5,28 @@
 import getopt
 import os
 import sys
+import time
 from collections import defaultdict
 
 import ansi
-from freecell import Board, GameException
-from games import Games
-from printers import TTY, LinePrinter, PrinterSheet
-
-Solved_Games = Games()
+from freecell import Board, GameException, SetDealStore
+from games import Games, open_games
+from printers import TTY, LinePrinter, NullPrinter, PrinterSheet, SamplingPrinter, ScreenPrinter
+from replay import replay_games
+
+# The options and the solved games are only set up once they are needed
+# (see main and get_solved_games), to keep the program quick to start.
+Opts = None
+Solved_Games = None
+
+def get_solved_games():
+    global Solved_Games
+    if Solved_Games is None:
+        Solved_Games = open_games(Opts.moves_file)
+    return Solved_Games
 
 def usage():
-    example_games = ', '.join(f'{i}' for i in list(Solved_Games.keys())[:20])
+    example_games = ', '.join(f'{i}' for i in list(get_solved_games().keys())[:20])
     print(f'''\nusage: {sys.argv[0]} [options]
 
 Generate MS compatible Freecell deals and play them.
@@ -25,13 +36,23 @@ Generate MS compatible Freecell deals and play them.
        -c or --cascades n - set number of cascades (1-{len(Board.CascadeNames)} default: 8)
        -p or --play-back n - play back game number n (e.g. {example_games})
        -P - play back all available solved games in moves file.
+       -V or --verify - like -P, but headless: replay the games across a process pool, reporting timings
+       -j or --jobs n - set the number of processes for --verify (default: one per CPU)
        -g or --game n - play game n (default: {Opts.game})
        -F or --file <file> - take input from a file (default: keyboard)
        -i or --ignore-dependencies - make the auto-mover ignore dependencies on other cards on the board
        -A or --available-moves - show possible moves before waiting for user input
-       -M or --moves-file - load moves from given file (default "{Games.default_file}")
+       -M or --moves-file - load moves from given file, text or binary (default "{Games.default_file}")
+       -D or --deal-store <file> - take deals from a deal store made by deals.py (default: shuffle them)
        -t or --tty - use tty printer (default line printer)
+       -S or --screen - use screen printer, drawing the boards in place (redrawing only what changed)
+       --stream - print each row of boards as soon as it's full (default: when the game ends or asks for a move)
+       --no-render - don't print the boards
+       --render-every n - only print every nth board (and the last one)
+       --render-final - only print the last board (of the game, or before asking for a move)
        --no-automoves - turn off automover
+       --stats - report the calls to, and time spent in, the engine's main methods (on stderr)
+       --profile <file> - profile the run, saving its hotspots to file
        -h or --help - print this help sheet
     Try e.g. "{sys.argv[0]} -p {Opts.game}" to run with a builtin game
 
@@ -47,14 +68,13 @@ Game features:
     sys.exit(1)
 
 class Options:
-    def __init__(self):
-        global Solved_Games
+    Default_game = 1 # the first game in the default moves file
 
+    def __init__(self):
         self.freecells = 4
         self.cascades = 8
         self.play_back = False
-        first_game = (list(Solved_Games.keys()) or [1])[0]
-        self.game = first_game
+        self.game = Options.Default_game
         self.input = None
         self.ignore_dependencies = False
         self.help = False
@@ -63,13 +83,25 @@ class Options:
         self.skips = []
         self.jump = 0
         self.tty = False
+        self.stream = False
+        self.screen = False
+        self.stats = False
+        self.profile = None
         self.no_automoves = False
+        self.verify = False
+        self.jobs = None
+        self.deal_store = None
+        self.moves_file = Games.default_file
+        self.render = True
+        self.render_every = 1
 
         try:
-            optslist, self.argv = getopt.getopt(sys.argv[1:], 'f:c:p:g:F:hiPAM:t', 
+            optslist, self.argv = getopt.getopt(sys.argv[1:], 'f:c:p:g:F:hiPAM:tVj:D:S', 
                     ['freecells=', 'cascades=', 'play-back=', 'game=', 'file=',
                      'help', 'ignore-dependencies', 'available-moves','skip=','jump=',
-                     'moves-file=', 'tty','no-automoves'])
+                     'moves-file=', 'tty','no-automoves', 'verify', 'jobs=', 'deal-store=',
+                     'no-render', 'render-every=', 'render-final', 'stream', 'screen',
+                     'stats', 'profile='])
 
         except getopt.GetoptError as err:
                 print(f'\n*** {err} ***\n')
@@ -93,42 +125,96 @@ class Options:
             elif arg in ('--available-moves', '-A'):
                 self.possible_moves = True
             elif arg in ('--moves-file', '-M'):
-                Solved_Games = Games(val)
+                self.moves_file = val
             elif arg in ('-P',):
                 self.play_all = True
-            elif arg in ('--skip'):
+            elif arg in ('--skip',):
                 self.skips = [int(i) for i in val.split(',')]
-            elif arg in ('--jump'):
+            elif arg in ('--jump',):
                 self.jump = int(val)
             elif arg in ('--tty', '-t'):
                 self.tty = True
             elif arg in ('--no-automoves',):
                 self.no_automoves = True
+            elif arg in ('--verify', '-V'):
+                self.verify = True
+            elif arg in ('--jobs', '-j'):
+                self.jobs = int(val)
+            elif arg in ('--deal-store', '-D'):
+                self.deal_store = val
+            elif arg in ('--screen', '-S'):
+                self.screen = True
+            elif arg in ('--stream',):
+                self.stream = True
+            elif arg in ('--no-render',):
+                self.render = False
+            elif arg in ('--render-every',):
+                self.render_every = int(val)
+                if self.render_every < 1:
+                    print(f'\n*** --render-every must be at least 1 ***\n')
+                    self.help = True
+            elif arg in ('--render-final',):
+                self.render_every = None
+            elif arg in ('--stats',):
+                self.stats = True
+            elif arg in ('--profile',):
+                self.profile = val
             elif arg in ('--help', '-h'):
                 self.help = True
 
         if self.input and self.play_back:
             print('*** Cannot specify both --input and --playback ***')
 
-Opts = Options()
-
 def main():
+    global Opts
+    Opts = Options()
+
     if Opts.help:
         usage()
 
+    if Opts.stats:
+        import stats
+        stats.instrument_game()
+
     try:
-        freecell()
+        if Opts.profile:
+            profile(freecell, Opts.profile)
+        else:
+            freecell()
     except GameException as e:
         print(f'*** Internal Game Engine Error: {e} ***')
         usage()
+    finally:
+        if Opts.stats:
+            stats.report()
+
+Profile_lines = 40 # the number of hotspots saved
+
+# Run the function under cProfile, saving its hotspots (the functions 
+# taking the most time, not counting the functions they call) to a file.
+
+def profile(function, filename):
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(function)
+    finally:
+        with open(filename, 'w') as fd:
+            pstats.Stats(profiler, stream=fd).sort_stats('tottime').print_stats(Profile_lines)
+        print(f'Saved the profile to "{filename}"', file=sys.stderr)
 
 # The top of the Freecell Game program
 
 def freecell():
     moves = []
 
+    if Opts.deal_store:
+        from deals import DealStore # deals imports NumPy, which is slow to load
+        SetDealStore(DealStore(Opts.deal_store))
+
     if Opts.play_back:
-        if Opts.game not in Solved_Games:
+        if Opts.game not in get_solved_games():
             print(f'*** Game "{Opts.game}" not available for playback ***')
             usage()
         moves = Solved_Games[Opts.game]
@@ -139,9 +225,12 @@ def freecell():
             usage()
         moves = open(Opts.input).readlines()
 
-    if Opts.play_all:
+    if Opts.verify:
+        verify_all()
+
+    elif Opts.play_all:
         passings = defaultdict(int)
-        for i in Solved_Games:
+        for i in get_solved_games():
             if i > Opts.jump and i not in Opts.skips:
                 result = play(i, Solved_Games[i])
                 passings[result] += 1
@@ -152,6 +241,29 @@ def freecell():
     else:
         play(Opts.game, moves)
 
+# Replay all the solved games without printing the boards, reporting 
+# the time each game took and the results.
+
+def verify_all():
+    solved_games = get_solved_games()
+    games = [(i, solved_games[i]) for i in solved_games if i > Opts.jump and i not in Opts.skips]
+    results = replay_games(games, jobs=Opts.jobs, freecells=Opts.freecells, cascades=Opts.cascades,
+                           ignore_dependencies=Opts.ignore_dependencies, automoves=not Opts.no_automoves)
+
+    start = time.perf_counter()
+    passings = defaultdict(int)
+    game_time = 0
+    for result in results:
+        passings[result.completed] += 1
+        game_time += result.elapsed
+        status = {True: 'completed', False: 'FAILED', None: 'quit'}[result.completed]
+        print(f'Game #{result.seed}: {status} in {result.elapsed * 1000:.1f}ms')
+    elapsed = time.perf_counter() - start
+
+    print(f'Number that completed {passings[True]}', file=sys.stderr)
+    print(f'Number that failed to complete {passings[False]}', file=sys.stderr)
+    print(f'Replayed {len(games)} games in {elapsed:.2f}s ({game_time:.2f}s of game time)', file=sys.stderr)
+
 def print_possible_moves(board):
     print('Available moves: ', end='')
     for i in board.get_possible_moves():
@@ -171,6 +283,17 @@ def print_title(printer, counter, move_type, color, move, prefix=''):
     printer.print_header(f'{text_color}{prefix} # {counter}. {move_type}: {move}{ansi.reset}')
 
 
+def get_printer():
+    if not Opts.render:
+        return NullPrinter()
+    if Opts.screen:
+        printer = ScreenPrinter()
+    else:
+        printer = TTY() if Opts.tty else LinePrinter(streaming=Opts.stream)
+    if Opts.render_every != 1:
+        printer = SamplingPrinter(printer, every=Opts.render_every)
+    return printer
+
 # The central game-play UI loop.
 # Plays one game by instantiating a board and feeding moves to it.
 # Moves are read the supplied list or user input.
@@ -178,7 +301,7 @@ def print_title(printer, counter, move_type, color, move, prefix=''):
 
 def play(seed, moves):
     movesLog = open('moves.log', 'w')
-    printer = TTY() if Opts.tty else LinePrinter() 
+    printer = get_printer()
 
     print(f'\n*** Game #{seed} ***\n')
 
@@ -195,6 +318,7 @@ def play(seed, moves):
 
         if not is_supplied_move:
             # If supplied input is exhausted, ask the user for input
+            board.print(final=True)
             printer.flush()
             if Opts.possible_moves:
                 print_possible_moves(board)
@@ -235,6 +359,7 @@ def play(seed, moves):
         if not valid:
             # If a supplied move is invalid, bail out.
             if is_supplied_move:
+                board.print(final=True)
                 printer.flush()
                 print(f'*** Failed Game #{seed} ***')
                 return False
@@ -250,6 +375,7 @@ def play(seed, moves):
                 board.move(move)
                 board.print()
 
+    board.print(final=True)
     printer.flush()
 
     print(f'\n*** Completed Game #{seed} ***\n')
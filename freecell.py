@@ -31,6 +31,7 @@ Moves
 
 import random
 import string
+from array import array
 
 import ansi
 from printers import TTY, PrinterSheet
@@ -45,8 +46,9 @@ class GameException(Exception): pass
 
 DECK_SIZE = 52
 
+# The cards are shared (see Cards), so a new deck is a new list of them.
 def NewDeck(n=DECK_SIZE):
-    return [Card(i) for i in range(n)]
+    return list(Cards[:n])
 
 def GetShuffledDeck(seed):
     deck = NewDeck()
@@ -57,6 +59,19 @@ def GetShuffledDeck(seed):
         deck[idx] = deck[-1]
         deck.pop()
 
+# A deal store (see deals.DealStore) to take deals from instead of shuffling.
+Deal_store = None
+
+def SetDealStore(store):
+    global Deal_store
+    Deal_store = store
+
+def GetDeck(seed):
+    deal = Deal_store.get_deal(seed) if Deal_store is not None else None
+    if deal is None:
+        return GetShuffledDeck(seed)
+    return (Cards[i] for i in deal)
+
 # A Linear Congruential Generator using parameters from MS Visual/Quick C/C++
 # https://en.wikipedia.org/wiki/Linear_congruential_generator#Parameters_in_common_use
 # This is intended to be an MS compiler runtime compatible version of rand.
@@ -66,9 +81,13 @@ class Random:
     Multiplier = 214013
     Increment = 2531011
     Output_shift = 16 # Extracts the output bitfield (bits 16-31 of the seed).
+    Tested = False
 
+    # The generator is checked once, when the first one is created.
     def __init__(self, seed):
-        self.test()
+        if not Random.Tested:
+            self.test()
+            Random.Tested = True
         self.seed = seed
 
     def random(self):
@@ -92,6 +111,7 @@ class Card:
         if number < 0 or number >= DECK_SIZE:
             raise GameException(f'Card __init__ botch: {number} is not in range')
 
+        self.number = number
         self.suit = Card.Suits[number % 4]
         self.glyph = Card.Glyphs[number % 4]
         self.rank_index = number // 4
@@ -100,11 +120,11 @@ class Card:
 
     # Can the new_card be on top of us (next lower rank, opposite color) in a tableau?
     def can_tableau(self, new_card):
-        return self.color != new_card.color and self.rank_index - 1 == new_card.rank_index
+        return Can_tableau[self.number][new_card.number]
 
     # Can the new card be on top of us (next higher rank, same suit) in homes?
     def can_home(self, new_card):
-        return self.suit == new_card.suit and self.rank_index + 1 == new_card.rank_index
+        return Can_home[self.number][new_card.number]
 
     def as_string(self, glyph=True):
         color_sequence = ansi.fg.__dict__[self.color]
@@ -112,9 +132,31 @@ class Card:
 
     def __repr__(self): # for debugging
         return f'Card: {self.rank}{self.glyph}'
+
+# The cards by number, for turning card numbers back into cards. These are the
+# only Card objects: decks and boards share them.
+Cards = tuple(Card(i) for i in range(DECK_SIZE))
+
+# Which cards can follow which, by card number: Can_tableau[a][b] is whether card b
+# can be on top of card a in a tableau, and Can_home[a][b] whether it can in homes.
+Can_tableau = tuple(tuple(a.color != b.color and a.rank_index - 1 == b.rank_index for b in Cards) for a in Cards)
+Can_home = tuple(tuple(a.suit == b.suit and a.rank_index + 1 == b.rank_index for b in Cards) for a in Cards)
     
 Infinite = float('Inf')
 
+# Zobrist keys for hashing board positions. A card's key depends on the type of column 
+# it is in and on the card it sits on (DECK_SIZE stands for the bottom of the column).
+# Since the keys don't depend on which column a card is in, the hash of a position 
+# ignores the order of the freecells and of the cascades, but not the order of the cards.
+
+def NewHashKeys(rand):
+    return [array('Q', rand.randbytes(8 * (DECK_SIZE + 1))) for card in range(DECK_SIZE)]
+
+Hash_random = random.Random(DECK_SIZE)
+Hash_keys = dict(FREECELL=NewHashKeys(Hash_random),
+                 HOME=NewHashKeys(Hash_random),
+                 CASCADE=NewHashKeys(Hash_random))
+
 # Columns are used to implement the free cells, suit foundations ("homes"), and cascades.
 
 class Column(list):
@@ -128,32 +170,54 @@ class Column(list):
                         
         self.location = self.as_a_move_location = location
         self.type = type
+        self.hash_keys = Hash_keys[type]
+        self.hash = 0
+        # The length of the ordered (tableau) run ending at each card of the column.
+        self.run_lengths = []
+        # Counts the changes to the column's cards (see Board.get_possible_moves).
+        self.version = 0
 
         # Set our instance properties appropriately based on the column type.
         self.__dict__.update(type_configurations[type])
 
     def add_card(self, card):
+        if self:
+            top_card = self[-1]
+            self.hash ^= self.hash_keys[card.number][top_card.number]
+            self.run_lengths.append(self.run_lengths[-1] + 1 if Can_tableau[top_card.number][card.number] else 1)
+        else:
+            self.hash ^= self.hash_keys[card.number][DECK_SIZE]
+            self.run_lengths.append(1)
         self.append(card)
+        self.version += 1
+
+    # Replace all the cards in the column.
+    def set_cards(self, cards):
+        self.clear()
+        self.hash = 0
+        self.run_lengths.clear()
+        self.version += 1
+        for card in cards:
+            self.add_card(card)
 
     def get_remaining_room(self):
         return self.max_length - len(self)
 
     # Can the given card be legally added to this columm?
+    # (This is called in the innermost loops, so it looks at the column directly.)
     def can_accept_card(self, new_card):
-        if self.get_remaining_room() == 0:
+        if len(self) >= self.max_length:
             return False
 
-        top_card = self.peek_card_on_top()
-
         if self.cascade:
-            if not top_card:
+            if not self:
                 return True
-            return top_card.can_tableau(new_card)
+            return Can_tableau[self[-1].number][new_card.number]
 
         else:
-            if not top_card:
+            if not self:
                 return new_card.rank == 'A' and new_card.glyph == self.location
-            return top_card.can_home(new_card)
+            return Can_home[self[-1].number][new_card.number]
 
     # Can some cards from the given column be added to this column, given the amount
     # of movement room?
@@ -163,28 +227,26 @@ class Column(list):
     # Find a legal move from the src column into ours and report
     # the number of cards it involves. Return 0 if there isn't one.
     def get_column_move_size(self, src_column, board_movement_room):
-        src_cards = src_column.peek_movable_cards()
-        src_length = len(src_cards)
+        src_length = src_column.get_movable_length()
         max_length = min(src_length, board_movement_room, self.get_remaining_room())
 
         # Scan the source cards to find the move point, trying
         # the largest run of cards first since moves to an empty column 
         # can start from any card in a tableau.
         for run_length in range(max_length, 0, -1):
-            card_at_move_point = src_cards[-run_length]
+            card_at_move_point = src_column[-run_length]
             if self.can_accept_card(card_at_move_point):
                 return run_length
         return 0
 
     # Get a list of all the cards that could be removed from the top of a column.
     def peek_movable_cards(self):
-        tableau = Column(type='CASCADE')
-        # Examine each card of the column in bottom-to-top order:
-        for card in self:
-            if not tableau.can_accept_card(card):
-                tableau.clear()
-            tableau.add_card(card)
-        return tableau
+        return self[-self.get_movable_length():] if self else []
+
+    # The number of cards that could be removed from the top of the column
+    # (the ordered run on top).
+    def get_movable_length(self):
+        return self.run_lengths[-1] if self else 0
 
     def peek_card_in_row(self, row):
         if row < len(self):
@@ -204,7 +266,13 @@ class Column(list):
         if card_count < 1:
             GameException('Column.remove_top_cards botch: card_count < 1')
         cards = self[-card_count:]
+        parent = self[-card_count - 1].number if len(self) > card_count else DECK_SIZE
+        for card in cards:
+            self.hash ^= self.hash_keys[card.number][parent]
+            parent = card.number
         self[-card_count:] = []
+        del self.run_lengths[-card_count:]
+        self.version += 1
         return cards
 
     def __repr__(self):
@@ -230,10 +298,13 @@ class ColumnGroup(list):
 # The Freecell Board, it allows standard and non-standard freecell 
 # boards to be created and played. Setting Ignore_dependencies=True
 # will allow the auto-mover to freely make any legal moves to home.
+# A seed of None leaves the board without any cards (see from_snapshot).
 
 class Board:
     FreeCellNames = 'abcdefgijklmnopqrstuvwxyz' # leaves out "h" (used for home)
     CascadeNames = '123456789' + string.ascii_uppercase
+    # The kinds of moves, most promising first (see get_ordered_moves).
+    Move_order = ('home', 'tableau', 'empty-cascade', 'freecell')
 
     def __init__(self, seed, printer=TTY(), freecells=4, cascades=8, ignore_dependencies=False):
         if cascades < 1 or cascades > len(Board.CascadeNames) or \
@@ -248,16 +319,87 @@ class Board:
         self.src_columns = {i.location: i for i in self.cascades + self.frees}
         self.dst_columns = {i.location: i for i in self.cascades + self.frees + self.homes}
 
-        self.move_counter = 0
-        self.undos = []
-        self.redos = []
+        # The homes whose cards can be tableaued on a card of the given color.
+        self.opposite_color_homes = dict(red=[i for i in self.homes if i.location in '♣♠'],
+                                         black=[i for i in self.homes if i.location in '♦♥'])
+
+        # Number the columns for move codes (see apply).
+        self.columns = self.cascades + self.frees + self.homes
+        for i, column in enumerate(self.columns):
+            column.index = i
+
         self.printer = printer
         self.ignore_dependencies = ignore_dependencies
+        self.subscribers = []
+
+        # The legal moves, as a matrix of move strings (None where there's no move) by
+        # source and destination column index, and the column versions and the number of
+        # empty freecells and cascades (the movement room) they were found with.
+        self.legal_moves = None
+        self.legal_moves_versions = None
+        self.legal_moves_room = None
 
         # Go round-robin, placing cards from the shuffled deck in each column of the cascades.
-        deck = GetShuffledDeck(seed)
-        for i, card in enumerate(deck):
-            self.cascades[i % len(self.cascades)].add_card(card)
+        if seed is not None:
+            deck = GetDeck(seed)
+            for i, card in enumerate(deck):
+                self.cascades[i % len(self.cascades)].add_card(card)
+
+        # A 64 bit Zobrist hash of the position, kept up to date as cards move.
+        self.hash = self.compute_hash()
+        self.start_history()
+
+    def compute_hash(self):
+        hash = 0
+        for column in self.cascades + self.frees + self.homes:
+            hash ^= column.hash
+        return hash
+
+    # A snapshot is a compact, immutable encoding of the whole position: the number
+    # of freecells and cascades, then the card numbers of each of the frees, cascades 
+    # and homes, each column followed by a separator.
+    def snapshot(self):
+        snapshot = bytearray((len(self.frees), len(self.cascades)))
+        for column in self.frees + self.cascades + self.homes:
+            snapshot.extend(card.number for card in column)
+            snapshot.append(Snapshot_separator)
+        return bytes(snapshot)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, printer=TTY(), ignore_dependencies=False):
+        board = cls(seed=None, printer=printer, freecells=snapshot[0], cascades=snapshot[1],
+                    ignore_dependencies=ignore_dependencies)
+        board.restore(snapshot)
+        return board
+
+    # Put the board into a snapshot's position. This starts a new game history.
+    def restore(self, snapshot):
+        if tuple(snapshot[:2]) != (len(self.frees), len(self.cascades)):
+            raise GameException('Board.restore botch: snapshot is for a different board layout')
+        self.set_cards(snapshot)
+        self.start_history()
+
+    def set_cards(self, snapshot):
+        start = 2
+        for column in self.frees + self.cascades + self.homes:
+            end = snapshot.index(Snapshot_separator, start)
+            column.set_cards(Cards[i] for i in snapshot[start:end])
+            start = end + 1
+        self.hash = self.compute_hash()
+
+    # The game history is an array of the moves made, as apply's tokens with the
+    # History_checkpoint flag added to user moves. The first "position" of them are
+    # on the board, and the rest have been undone and can be redone. A snapshot is 
+    # kept of every History_interval-th position, for seek.
+    def start_history(self):
+        self.history = array('L')
+        self.position = 0
+        self.history_snapshots = [self.snapshot()]
+
+    # The number of moves made (not counting those undone).
+    @property
+    def move_counter(self):
+        return self.position
 
     def is_empty(self):
         columns_in_use = sum(1 for i in self.frees + self.cascades if i)
@@ -285,6 +427,26 @@ class Board:
     # This raises a UserException if the move is illegal in any way.
     
     def perform_move(self, move, make_checkpoint):
+        try:
+            src_column, dst_column, card_count = self.check_move(move)
+        except UserException:
+            if self.subscribers:
+                self.publish('illegal-move', move[:1], move[1:2], 0, self.move_counter)
+            raise
+
+        self.move_cards(src_column, dst_column, card_count)
+
+        self.record_move(src_column, dst_column, card_count, make_checkpoint)
+
+        if self.subscribers:
+            self.publish('user-move' if make_checkpoint else 'auto-move', src_column.as_a_move_location,
+                         dst_column.as_a_move_location, card_count, self.move_counter - 1)
+            if self.is_empty():
+                self.publish('game-complete', None, None, 0, self.move_counter)
+
+    # Find the columns a move is between and the number of cards it moves,
+    # raising a UserException if the move is illegal.
+    def check_move(self, move):
         if len(move) != 2:
             raise UserException(f'Error, move "{move}" is not two characters')
 
@@ -308,12 +470,45 @@ class Board:
 
         if movable_cards == 0:
             raise UserException(f'Illegal move {move}')
-    
-        dst_column.add_cards_from_column(src_column, movable_cards)
 
-        self.record_move(src_column, dst_column, movable_cards, make_checkpoint)
+        return src_column, dst_column, movable_cards
+
+    # A low-level make/unmake move interface for searches. Moves are given as codes:
+    # (source column index << 6) | destination column index, using the indexes of
+    # Board.columns. Moves home should use the home of the source's top card, as 
+    # get_move_code does for "h". The legality rules are those of perform_move, but
+    # apply returns None for an illegal move, and neither records undo history nor
+    # counts moves. Otherwise it returns a token that revert uses to take the move back.
+
+    def apply(self, move_code):
+        src_index = move_code >> 6
+        dst_index = move_code & 63
+        if src_index >= len(self.src_columns) or dst_index >= len(self.columns):
+            return None
+        src_column = self.columns[src_index]
+        dst_column = self.columns[dst_index]
+        card_count = dst_column.get_column_move_size(src_column, self.get_board_movement_room(dst_column))
+        if card_count == 0:
+            return None
+        self.move_cards(src_column, dst_column, card_count)
+        return card_count << 12 | move_code
+
+    def revert(self, token):
+        self.move_cards(self.columns[token & 63], self.columns[token >> 6 & 63], token >> 12 & 63)
+
+    # Translate a move string into a move code, or None if it names no columns.
+    def get_move_code(self, move):
+        if len(move) != 2:
+            return None
+        src_column = self.get_src_column(move[0])
+        card = src_column.peek_card_on_top() if src_column is not None else None
+        dst_column = self.get_dst_column(move[1], card) if card else None
+        if dst_column is None:
+            return None
+        return src_column.index << 6 | dst_column.index
 
-        self.move_counter += 1
+    def get_move_string(self, move_code):
+        return self.columns[move_code >> 6].as_a_move_location + self.columns[move_code & 63].as_a_move_location
 
     # The public "move" interface that catches and reports user errors.
     def move(self, move, make_checkpoint=False):
@@ -329,27 +524,126 @@ class Board:
 
     # Hunt for cards on top of the cascades and in free cells that can
     # be moved home, avoiding ones that may still be depended upon.
-    # Generate moves to effect these changes.
+    # Generate moves to effect these changes. The caller makes each move
+    # before asking for the next one.
     def automatic_moves(self):
-        while True:
-            for src_column in self.src_columns.values():
-                card = src_column.peek_card_on_top()
-                if card and self.card_is_safe_to_move(card):
-                    dst_column = self.homes.find_column_for_card(card)
-                    if dst_column is not None:
-                        yield src_column.as_a_move_location + dst_column.as_a_move_location
-                        break
-            
-            else: # After we've scanned all the columns without yielding a move, we're done.
-                break
+        src_columns = list(self.src_columns.values())
+        # The source columns whose top card can go home, by their index. Moves
+        # are always made from the first of these, as a scan of the columns would.
+        ready = {i for i, column in enumerate(src_columns) if self.can_automove(column)}
+        # The source columns' indexes, by the number of their top card.
+        tops = {column[-1].number: i for i, column in enumerate(src_columns) if column}
+
+        while ready:
+            i = min(ready)
+            src_column = src_columns[i]
+            card = src_column[-1]
+            dst_column = self.homes.find_column_for_card(card)
+            yield src_column.as_a_move_location + dst_column.as_a_move_location
+
+            if src_column and src_column[-1] is card:
+                continue # The move wasn't made.
+
+            # Rather than scanning all the columns again, only check the column's new 
+            # top card and the cards of the next rank, which this card's going home
+            # may have made movable or safe to move.
+            ready.discard(i)
+            del tops[card.number]
+            changed = [i]
+            if src_column:
+                tops[src_column[-1].number] = i
+            next_rank = (card.rank_index + 1) * len(Card.Suits)
+            for number in range(next_rank, min(next_rank + len(Card.Suits), DECK_SIZE)):
+                if number in tops:
+                    changed.append(tops[number])
+            for j in changed:
+                if self.can_automove(src_columns[j]):
+                    ready.add(j)
+
+    # Can the top card of the column be moved home by the automover?
+    def can_automove(self, src_column):
+        card = src_column.peek_card_on_top()
+        return bool(card) and self.card_is_safe_to_move(card) and \
+            self.homes.find_column_for_card(card) is not None
 
     # Return all the moves currently allowed on the board.
     def get_possible_moves(self):
-        for src_column in self.src_columns.values():
-            for dst_column in self.dst_columns.values():
-                board_movement_room = self.get_board_movement_room(dst_column)
-                if dst_column.can_accept_column(src_column, board_movement_room):
-                    yield src_column.as_a_move_location + dst_column.as_a_move_location
+        for row in self.get_legal_moves():
+            for move in row:
+                if move:
+                    yield move
+
+    # Generate the moves currently allowed on the board kind by kind, in the given 
+    # order of Board.Move_order's kinds of moves: moves home, moves building on 
+    # tableaus, moves to an empty cascade and moves to a freecell. Moves to empty
+    # cascades (or freecells) are only made to the first of them, as the others
+    # would be the same. Each move is only checked when it's asked for, so stopping
+    # early saves the work of the rest. The board mustn't change until the end.
+    def get_ordered_moves(self, order=Move_order):
+        for move_code in self.get_ordered_move_codes(order):
+            yield self.get_move_string(move_code)
+
+    # The same as move codes (see apply).
+    def get_ordered_move_codes(self, order=Move_order):
+        src_columns = self.columns[:len(self.src_columns)]
+        empty_frees = sum(1 for i in self.frees if not i)
+        empty_cascades = sum(1 for i in self.cascades if not i)
+
+        for kind in order:
+            if kind == 'home':
+                dst_columns = None # the home of each source's top card, as for "h"
+            elif kind == 'tableau':
+                dst_columns = [i for i in self.cascades if i]
+            elif kind == 'empty-cascade':
+                dst_columns = [i for i in self.cascades if not i][:1]
+            elif kind == 'freecell':
+                dst_columns = [i for i in self.frees if not i][:1]
+            else:
+                raise GameException(f'Board.get_ordered_move_codes botch: unknown kind of move "{kind}"')
+
+            for src_column in src_columns:
+                if dst_columns is None:
+                    if not src_column:
+                        continue
+                    columns = [self.homes[src_column[-1].number % len(Card.Suits)]]
+                else:
+                    columns = dst_columns
+                for dst_column in columns:
+                    room = self.get_movement_room(dst_column, empty_frees, empty_cascades)
+                    if dst_column.can_accept_column(src_column, room):
+                        yield src_column.index << 6 | dst_column.index
+
+    # Bring the legal moves matrix up to date. Only the moves from and to the 
+    # columns that changed since it was last brought up to date are found again,
+    # unless the movement room changed, which can change any of them.
+    def get_legal_moves(self):
+        columns = self.columns
+        src_columns = columns[:len(self.src_columns)]
+        empty_frees = sum(1 for i in self.frees if not i)
+        empty_cascades = sum(1 for i in self.cascades if not i)
+
+        if self.legal_moves is None or (empty_frees, empty_cascades) != self.legal_moves_room:
+            self.legal_moves = [[None] * len(columns) for i in src_columns]
+            pairs = [(src_column, dst_column) for src_column in src_columns for dst_column in columns]
+        else:
+            changed = {i.index for i, version in zip(columns, self.legal_moves_versions) if i.version != version}
+            if not changed:
+                return self.legal_moves
+            pairs = [(columns[i], dst_column) for i in changed if i < len(src_columns) for dst_column in columns]
+            pairs += [(src_column, columns[i]) for i in changed for src_column in src_columns
+                      if src_column.index not in changed]
+
+        rooms = [self.get_movement_room(i, empty_frees, empty_cascades) for i in columns]
+        for src_column, dst_column in pairs:
+            if dst_column.can_accept_column(src_column, rooms[dst_column.index]):
+                move = src_column.as_a_move_location + dst_column.as_a_move_location
+            else:
+                move = None
+            self.legal_moves[src_column.index][dst_column.index] = move
+
+        self.legal_moves_versions = [i.version for i in columns]
+        self.legal_moves_room = (empty_frees, empty_cascades)
+        return self.legal_moves
 
     # Is there no card on the board that could follow this card in a tableau?
     # (Such a card could become orphaned if it loses this card as its tableau base)
@@ -357,10 +651,13 @@ class Board:
         # We ignore Aces or 2s as possible dependents. Aces will never depend on 
         # 2s because they move directly to home. Someone told me we can also ignore 2s.
         if card.rank_index > Card.Ranks.index("2") and not self.ignore_dependencies:
-            for column in self.src_columns.values():
-                for board_card in column:
-                    if card.can_tableau(board_card):
-                        return False
+            # Cards only leave the board by going home, so the homes' heights count
+            # the cards of each rank and suit still on the board. The possible dependents 
+            # (next lower rank, opposite color) are gone once the opposite color homes
+            # have reached that rank.
+            for home in self.opposite_color_homes[card.color]:
+                if len(home) < card.rank_index:
+                    return False
         return True
 
     # The number of cards that can be moved at one time is given by:
@@ -368,15 +665,33 @@ class Board:
     # (The destination column is excluded from the empty column count)
     def get_board_movement_room(self, dst_column):
         empty_frees = sum(1 for i in self.frees if not i)
-        empty_columns = sum(1 for i in self.cascades if not i and i.location != dst_column.location)
-        return (1 + empty_frees) * 2**empty_columns
+        empty_cascades = sum(1 for i in self.cascades if not i)
+        return self.get_movement_room(dst_column, empty_frees, empty_cascades)
+
+    # The same, given the board's counts of empty freecells and cascades.
+    def get_movement_room(self, dst_column, empty_frees, empty_cascades):
+        if dst_column.type == 'CASCADE' and not dst_column:
+            empty_cascades -= 1
+        return (1 + empty_frees) * 2**empty_cascades
+
+    # Move cards between columns, updating the board's hash by the change in
+    # the two columns' hashes.
+    def move_cards(self, src_column, dst_column, card_count):
+        old_hash = src_column.hash ^ dst_column.hash
+        dst_column.add_cards_from_column(src_column, card_count)
+        self.hash ^= old_hash ^ src_column.hash ^ dst_column.hash
 
     # Record card movements between columns for undo purposes.
     def record_move(self, src_column, dst_column, card_count, make_checkpoint):
-        record = Record(src_column=src_column, dst_column=dst_column, card_count=card_count, 
-                        checkpoint=make_checkpoint, move_counter=self.move_counter)
-        self.undos.append(record)
-        self.redos = [] # When any move occurs it cancels the existing redos.
+        # When any move occurs it cancels the existing redos.
+        del self.history[self.position:]
+        del self.history_snapshots[self.position // History_interval + 1:]
+
+        self.history.append(card_count << 12 | src_column.index << 6 | dst_column.index |
+                            (History_checkpoint if make_checkpoint else 0))
+        self.position += 1
+        if self.position % History_interval == 0:
+            self.history_snapshots.append(self.snapshot())
 
     def undo(self, printer=None):
         return self.undo_redo(is_undoing=True, printer=printer)
@@ -384,48 +699,91 @@ class Board:
     def redo(self, printer=None):
         return self.undo_redo(is_undoing=False, printer=printer)
 
-    # Move through the undo/redo records undoing moves (or undoing undos)
+    # Move through the history undoing moves (or redoing undone ones)
     # until the next checkpoint.
     def undo_redo(self, is_undoing, printer):
-        if is_undoing:
-            from_do, to_do = self.undos, self.redos
-        else:
-            from_do, to_do = self.redos, self.undos
-
-        success = bool(from_do)
-        stop = False
-        while from_do and not stop:
-            record = from_do.pop()
-            to_do.append(record)
-            src_column = record.src_column
-            dst_column = record.dst_column
-            card_count = record.card_count
-            checkpoint = record.checkpoint
-            self.move_counter = record.move_counter
+        success = self.position > 0 if is_undoing else self.position < len(self.history)
+        stop = not success
+        while not stop:
+            if is_undoing:
+                self.position -= 1
+            entry = self.history[self.position]
+            src_column = self.columns[entry >> 6 & 63]
+            dst_column = self.columns[entry & 63]
+            card_count = entry >> 12 & 63
+            checkpoint = bool(entry & History_checkpoint)
+            move_number = self.position
  
             if is_undoing:
                 # Put the dst_column cards back on the src_column
-                src_column.add_cards_from_column(dst_column, card_count)
+                self.move_cards(dst_column, src_column, card_count)
                 # When undoing, we stop after we've undone a checkpointed (user) move
-                stop = checkpoint
+                stop = checkpoint or self.position == 0
 
             else:
                 # Repeat a move that was on our undone history list.
-                dst_column.add_cards_from_column(src_column, card_count)
+                self.move_cards(src_column, dst_column, card_count)
                 # When redoing, we stop before redo-ing another user move.
-                stop = from_do and from_do[-1].checkpoint
+                stop = self.position + 1 == len(self.history) or \
+                    bool(self.history[self.position + 1] & History_checkpoint)
+
+            if self.subscribers:
+                self.publish('undo' if is_undoing else 'redo', src_column.as_a_move_location,
+                             dst_column.as_a_move_location, card_count, move_number)
 
+            # The printer sees the number of the move being redone as the move counter, 
+            # as it does that of the move being undone, so the position moves on after.
             if printer:
                 move = src_column.as_a_move_location + dst_column.as_a_move_location
                 printer(self, move=move, at_checkpoint=checkpoint)
 
+            if not is_undoing:
+                self.position += 1
+
         if success and not is_undoing:
-            # Correct for the fact that the checkpoint is made before the counter is incremented.
-            self.move_counter += 1
+            if self.subscribers and self.is_empty():
+                self.publish('game-complete', None, None, 0, self.move_counter)
 
         return success
 
-    def print(self):
+    # Jump to the position after the first move_number moves of the history 
+    # (undoing or redoing moves silently), starting from the nearest snapshot 
+    # when that's quicker than moving through the history from here.
+    def seek(self, move_number):
+        if not 0 <= move_number <= len(self.history):
+            raise GameException(f'Board.seek botch: no move {move_number} in the history')
+
+        base = move_number // History_interval * History_interval
+        if move_number - base < abs(move_number - self.position):
+            self.set_cards(self.history_snapshots[base // History_interval])
+            self.position = base
+
+        while self.position > move_number:
+            self.position -= 1
+            self.revert(self.history[self.position])
+        while self.position < move_number:
+            entry = self.history[self.position]
+            self.move_cards(self.columns[entry >> 6 & 63], self.columns[entry & 63], entry >> 12 & 63)
+            self.position += 1
+
+    # Have the subscriber (a function) called with a MoveEvent for everything 
+    # that happens on the board. Without subscribers, nothing is published.
+    def subscribe(self, subscriber):
+        self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def publish(self, kind, src, dst, card_count, move_counter):
+        event = MoveEvent(kind, src, dst, card_count, move_counter)
+        for subscriber in self.subscribers:
+            subscriber(event)
+
+    # Print the board, unless the printer doesn't want it (see printers.TTY).
+    def print(self, final=False):
+        if not self.printer.wants_board(final):
+            return
+
         sheet = PrinterSheet()
 
         # Print Frees and Homes
@@ -453,7 +811,26 @@ class Board:
 
         self.printer.print_sheet(sheet)
 
-# A record of one game board changed used by undo/redo
-class Record:
-    def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
\ No newline at end of file
+Snapshot_separator = 0xFF
+
+History_checkpoint = 1 << 18 # (above the card count of a move token)
+History_interval = 64
+
+# An event published to a board's subscribers. The kind is one of MoveEvent.Kinds.
+# src and dst are the move's locations (as in the move's string, with "h" for home),
+# card_count is the number of cards it moved, and move_counter is the move's number
+# (for undo and redo, that of the move taken back or repeated). An illegal move 
+# moves no cards, and a game-complete event has no locations.
+
+class MoveEvent:
+    Kinds = ('user-move', 'auto-move', 'undo', 'redo', 'illegal-move', 'game-complete')
+
+    def __init__(self, kind, src, dst, card_count, move_counter):
+        self.kind = kind
+        self.src = src
+        self.dst = dst
+        self.card_count = card_count
+        self.move_counter = move_counter
+
+    def __repr__(self): # for debugging
+        return f'MoveEvent: {self.kind} {self.src}{self.dst} x{self.card_count} #{self.move_counter}'
@@ -1,26 +1,185 @@
-# Load the moves.txt file into a dictionary
+# Load the moves.txt file into a dictionary-like mapping of game numbers to moves.
+# The file is scanned once for the byte ranges of the games, and a game's moves
+# are only read and parsed when it's asked for. The scan is cached in an index
+# file next to the moves file, which is rebuilt when the moves file changes.
 
-import re
+import json
+import mmap
 import os
+import re
+import struct
+import sys
+from collections.abc import Mapping
 
-class Games(dict):
+from freecell import Board, GameException
+
+class Games(Mapping):
     default_file='fixed_moves.txt'
     def __init__(self, filename=default_file):
+        self.filename = filename
+        self.index_file = filename + '.idx'
+        self.ranges = {} # game number -> (start, end) byte offsets of its moves
+        self.fd = None
         if not os.path.exists(filename):
             print(f'Could not open "{filename}" -- no games loaded')
             return
-        fd = open(filename)
-        moves = ''
+        self.ranges = self.load_index()
+
+    def __getitem__(self, game):
+        start, end = self.ranges[game]
+        if self.fd is None:
+            self.fd = open(self.filename, 'rb')
+        self.fd.seek(start)
+        return self.fd.read(end - start).decode().split()
+
+    def __contains__(self, game):
+        return game in self.ranges
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return len(self.ranges)
+
+    # Use the cached index if it was made from the file as it is now.
+    def load_index(self):
+        stat = os.stat(self.filename)
+        try:
+            with open(self.index_file) as fd:
+                index = json.load(fd)
+            if index['mtime'] == stat.st_mtime_ns and index['size'] == stat.st_size:
+                return {game: (start, end) for game, start, end in index['games']}
+        except (OSError, ValueError, KeyError):
+            pass
+
+        ranges = self.scan()
+        try:
+            with open(self.index_file, 'w') as fd:
+                json.dump(dict(mtime=stat.st_mtime_ns, size=stat.st_size,
+                               games=[[game, start, end] for game, (start, end) in ranges.items()]), fd)
+        except OSError:
+            pass # An unwritable directory just means scanning the file next time.
+        return ranges
+
+    def scan(self):
+        ranges = {}
         game = None
-        for i in fd.readlines():
-            # Recognize a game header line, e.g. "#29596, longest at 53 moves"
-            game_no = re.search(r'#(\d*)', i)
-            if game_no:
-                if game is not None:
-                    self[game] = moves.split()
-                moves = ''
-                game = int(game_no.group(1))
-            else:
-                moves += i
-
-        self[game] = moves.split()
+        offset = start = 0
+        with open(self.filename, 'rb') as fd:
+            for i in fd:
+                # Recognize a game header line, e.g. "#29596, longest at 53 moves"
+                game_no = re.search(rb'#(\d*)', i)
+                if game_no:
+                    if game is not None:
+                        ranges[game] = (start, offset)
+                    game = int(game_no.group(1))
+                    start = offset + len(i)
+                offset += len(i)
+
+        if game is not None:
+            ranges[game] = (start, offset)
+        return ranges
+
+# A compact binary format for solutions. After the magic number, each game is a
+# header (seed, freecells, cascades, move count) followed by one byte per move.
+# A move's byte is its source's index times the number of destinations plus its
+# destination's index, where the sources are the cascades then the freecells, and
+# the destinations add "h" and "#" to those. That fits boards of up to 15 columns.
+
+Binary_magic = b'FCSOLN1\n'
+Binary_header = struct.Struct('<IBBH')
+
+def get_move_names(freecells, cascades):
+    sources = Board.CascadeNames[:cascades] + Board.FreeCellNames[:freecells]
+    destinations = sources + 'h#'
+    if len(sources) * len(destinations) > 256:
+        raise GameException(f'{freecells} freecells and {cascades} cascades are too many for one byte moves')
+    return [src + dst for src in sources for dst in destinations]
+
+# A read-only mapping of game numbers to moves, like Games, backed by a
+# memory-mapped binary solutions file.
+
+class BinaryGames(Mapping):
+    def __init__(self, filename):
+        self.filename = filename
+        self.games = {} # game number -> (moves offset, move count, freecells, cascades)
+        self.move_names = {}
+        with open(filename, 'rb') as fd:
+            self.data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(Binary_magic)] != Binary_magic:
+            raise GameException(f'"{filename}" is not a binary solutions file')
+
+        offset = len(Binary_magic)
+        while offset < len(self.data):
+            seed, freecells, cascades, count = Binary_header.unpack_from(self.data, offset)
+            offset += Binary_header.size
+            self.games[seed] = (offset, count, freecells, cascades)
+            offset += count
+
+    def __getitem__(self, game):
+        offset, count, freecells, cascades = self.games[game]
+        names = self.get_names(freecells, cascades)
+        return [names[i] for i in self.data[offset:offset + count]]
+
+    def __contains__(self, game):
+        return game in self.games
+
+    def __iter__(self):
+        return iter(self.games)
+
+    def __len__(self):
+        return len(self.games)
+
+    # The game's moves as an uncopied view of the file's bytes.
+    def get_move_bytes(self, game):
+        offset, count, freecells, cascades = self.games[game]
+        return memoryview(self.data)[offset:offset + count]
+
+    # The number of freecells and cascades the game was solved with.
+    def get_layout(self, game):
+        return self.games[game][2:]
+
+    def get_names(self, freecells, cascades):
+        if (freecells, cascades) not in self.move_names:
+            self.move_names[freecells, cascades] = get_move_names(freecells, cascades)
+        return self.move_names[freecells, cascades]
+
+# Open a moves file, in either the text or the binary format.
+
+def open_games(filename=Games.default_file):
+    if os.path.exists(filename):
+        with open(filename, 'rb') as fd:
+            if fd.read(len(Binary_magic)) == Binary_magic:
+                return BinaryGames(filename)
+    return Games(filename)
+
+# Convert a text moves file into a binary one, returning the numbers of the
+# games that couldn't be converted (because they have moves with no byte code).
+
+def convert_games(src_filename, dst_filename, freecells=4, cascades=8):
+    games = Games(src_filename)
+    codes = {name: i for i, name in enumerate(get_move_names(freecells, cascades))}
+    skipped = []
+    with open(dst_filename, 'wb') as fd:
+        fd.write(Binary_magic)
+        for seed in games:
+            moves = games[seed]
+            if not all(move in codes for move in moves) or len(moves) > 0xFFFF:
+                skipped.append(seed)
+                continue
+            fd.write(Binary_header.pack(seed, freecells, cascades, len(moves)))
+            fd.write(bytes(codes[move] for move in moves))
+    return skipped
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 5):
+        print(f'''\nusage: {sys.argv[0]} <moves file> <binary file> [freecells cascades]
+
+Convert a text moves file (e.g. "{Games.default_file}") into the binary solutions format.
+''')
+        sys.exit(1)
+    layout = [int(i) for i in sys.argv[3:]]
+    skipped = convert_games(sys.argv[1], sys.argv[2], *layout)
+    print(f'Converted "{sys.argv[1]}" to "{sys.argv[2]}"')
+    if skipped:
+        print(f'*** Skipped games with moves that have no byte code: {", ".join(str(i) for i in skipped)} ***')
@@ -3,37 +3,77 @@
 import os
 import re
 import sys
-from io import StringIO
 
 import ansi
 
+# The printed cells of the cards, by card number, built the first time each card
+# is printed, and of an empty place. Every cell is CELL_WIDTH columns wide.
+
+Card_cells = {}
+Empty_cell = ansi.bg.green + '   ' + ansi.bg.black
+CELL_WIDTH = 3
+
 # PrinterSheet offers a print (and printcard) function that stores all printed output 
-# in a string for later retrieval as lines.
+# for later retrieval as lines, keeping track of how wide each line prints. Each line
+# is kept as the pieces (such as cards' cells) it was printed in.
 
 class PrinterSheet:
     def __init__(self):
-        self.output_file = StringIO()
+        self.rows = [] # the pieces of each line
+        self.widths = []
+        self.line = [] # the pieces of the line being printed
+        self.width = 0
 
-    def print(self, *args, **kwargs):
-        print(*args, **kwargs, file=self.output_file)
+    def print(self, *args, sep=' ', end='\n'):
+        pieces = (sep.join(str(i) for i in args) + end).split('\n')
+        self.add(pieces[0])
+        for piece in pieces[1:]:
+            self.end_line()
+            self.add(piece)
 
     def printcard(self, card):
-        chars = ansi.bg.green
-        if card:
-            chars += card.as_string()
+        if not card:
+            self.line.append(Empty_cell)
         else:
-            chars += '   '
-        chars += ansi.bg.black
-        print(chars, end='', file=self.output_file)
+            cell = Card_cells.get(card.number)
+            if cell is None:
+                cell = Card_cells[card.number] = ansi.bg.green + card.as_string() + ansi.bg.black
+            self.line.append(cell)
+        self.width += CELL_WIDTH
+
+    def add(self, text):
+        if text:
+            self.line.append(text)
+            self.width += get_cached_printing_length(text)
+
+    def end_line(self):
+        self.rows.append(self.line)
+        self.widths.append(self.width)
+        self.line = []
+        self.width = 0
+
+    def get_rows(self):
+        return self.rows + ([self.line] if self.line else [])
 
     def get_lines(self):
-        return self.output_file.getvalue().splitlines()
+        return [''.join(i) for i in self.get_rows()]
+
+    def get_widths(self):
+        return self.widths + ([self.width] if self.line else [])
+
+# Printers tell the Board which boards they want printed, so it can skip building
+# the sheets of the others. A "final" board is one the game stays at, at its end
+# or while waiting for input. Most printers want every board, which makes the
+# final ones repeats.
 
 # TTY prints freecell board sheets in a normal scrolling terminal-like manner.
 
 class TTY:
     def flush(self): pass
 
+    def wants_board(self, final=False):
+        return not final
+
     def print_lines(self, lines):
         sys.stdout.write('\n'.join(lines)+'\n')
 
@@ -42,7 +82,123 @@ class TTY:
 
     def print_header(self, *args, **kwargs):
         print('\n', *args, **kwargs)
-        
+
+# ScreenPrinter draws the boards in place on the screen, remembering what it drew
+# so that it only redraws the pieces of each line (the cards' cells mostly) that
+# changed. Below the board the screen scrolls as usual, and is cleared with each
+# board.
+
+class ScreenPrinter:
+    HEADER_ROW = 1
+    BOARD_ROW = 3
+
+    def __init__(self):
+        self.rows = [] # the pieces of each line of the board on the screen
+        self.header = ''
+        self.drawn_header = None
+
+    def flush(self): pass
+
+    def wants_board(self, final=False):
+        return not final
+
+    def print_lines(self, lines):
+        sys.stdout.write('\n'.join(lines)+'\n')
+
+    def print_sheet(self, sheet: PrinterSheet):
+        output = []
+        if self.drawn_header is None:
+            output.append(ansi.clear)
+        if self.header != self.drawn_header:
+            output.append(ansi.move_to(self.HEADER_ROW, 1) + ansi.reset + self.header + ansi.erase_line)
+            self.drawn_header = self.header
+
+        rows = sheet.get_rows()
+        for i, pieces in enumerate(rows):
+            drawn = self.rows[i] if i < len(self.rows) else []
+            self.draw_row(output, self.BOARD_ROW + i, drawn, pieces)
+        for i in range(len(rows), len(self.rows)):
+            output.append(ansi.move_to(self.BOARD_ROW + i, 1) + ansi.erase_line)
+        self.rows = rows
+
+        output.append(ansi.move_to(self.BOARD_ROW + len(rows) + 1, 1) + ansi.reset + ansi.erase_below)
+        sys.stdout.write(''.join(output))
+
+    # Draw the pieces of a line that differ from those drawn there before. Once
+    # a piece's width changes, the rest of the line has moved and is redrawn.
+    def draw_row(self, output, row, drawn, pieces):
+        col = 1
+        drawing = moved = False
+        for i, piece in enumerate(pieces):
+            width = get_cached_printing_length(piece)
+            if moved or i >= len(drawn) or drawn[i] != piece:
+                if not drawing:
+                    output.append(ansi.move_to(row, col) + ansi.reset)
+                    drawing = True
+                output.append(piece)
+                moved = moved or i >= len(drawn) or get_cached_printing_length(drawn[i]) != width
+            else:
+                drawing = False
+            col += width
+        if col - 1 < sum(get_cached_printing_length(i) for i in drawn):
+            output.append(ansi.move_to(row, col) + ansi.reset + ansi.erase_line)
+
+    def print_header(self, *args, **kwargs):
+        self.header = ' '.join(str(i) for i in args)
+
+# NullPrinter prints nothing, and so wants no boards.
+
+class NullPrinter:
+    def flush(self): pass
+
+    def wants_board(self, final=False):
+        return False
+
+    def print_lines(self, lines): pass
+
+    def print_sheet(self, sheet: PrinterSheet): pass
+
+    def print_header(self, *args, **kwargs): pass
+
+# SamplingPrinter prints only every nth board (the first, the n+1th and so on) 
+# through another printer, or with n=None only the final boards. The header 
+# of a skipped board is dropped with it.
+
+class SamplingPrinter:
+    def __init__(self, printer, every=None):
+        self.printer = printer
+        self.every = every
+        self.count = 0
+        self.skipped = False
+        self.header = None
+
+    def flush(self):
+        self.printer.flush()
+
+    # A final board is only wanted if the last board was skipped, and then only once.
+    def wants_board(self, final=False):
+        if final:
+            wanted = self.skipped
+            self.skipped = False
+            return wanted
+        wanted = self.every is not None and self.count % self.every == 0
+        self.count += 1
+        self.skipped = not wanted
+        return wanted
+
+    def print_lines(self, lines):
+        self.printer.print_lines(lines)
+
+    def print_sheet(self, sheet: PrinterSheet):
+        if self.header is not None:
+            args, kwargs = self.header
+            self.printer.print_header(*args, **kwargs)
+            self.header = None
+        self.printer.print_sheet(sheet)
+
+    def print_header(self, *args, **kwargs):
+        self.header = (args, kwargs)
+
 Ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
 
 # Find the length of a line as printed (ignoring the Ansi markup characters).
@@ -50,45 +206,81 @@ Ansi_escape = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
 def get_printing_length(line):
     return len(Ansi_escape.sub('', line))
 
-# A Block is a single game-board's worth of output lines, to be tiled horizontally.
+# The same, remembering the lengths of the text printed on every board (such as the
+# location guides).
+
+Printing_lengths = {}
+
+def get_cached_printing_length(text):
+    length = Printing_lengths.get(text)
+    if length is None:
+        length = Printing_lengths[text] = get_printing_length(text)
+    return length
+
+# A Block is a single game-board's worth of output lines, to be tiled horizontally,
+# along with the width of each line as printed.
 
 class Block(list): 
+    def __init__(self):
+        self.widths = []
+
+    def extend(self, lines, widths=None):
+        lines = list(lines)
+        list.extend(self, lines)
+        self.widths.extend(widths if widths is not None else (get_printing_length(i) for i in lines))
+
+    def insert_lines(self, lines):
+        self[0:0] = lines
+        self.widths[0:0] = [get_printing_length(i) for i in lines]
+
     def finalize(self):
         self.rows = len(self)
-        self.cols = max(get_printing_length(i) for i in self)
+        self.cols = max(self.widths)
 
     def get_row(self, row):
         if row >= len(self):
             return ' '*self.cols
-        row_cols = get_printing_length(self[row])
-        return self[row] + (self.cols - row_cols) * ' '
+        return self[row] + (self.cols - self.widths[row]) * ' '
 
 MARGIN = 2 # 2 columns between blocks
 
+# The (rows, columns) of the terminal, looked up once per process.
+Terminal_size = None
+
 def get_terminal_size():
-    rows_cols = os.popen('stty size 2>/dev/null', 'r').read().split()
-    # Handle the piped input case
-    if not rows_cols:
-        return (40, 120)
-    return (int(i) for i in rows_cols)
+    global Terminal_size
+    if Terminal_size is None:
+        try:
+            columns, rows = os.get_terminal_size(sys.stdin.fileno())
+            Terminal_size = (rows, columns)
+        except (OSError, ValueError):
+            # Handle the piped input case
+            Terminal_size = (40, 120)
+    return Terminal_size
 
 # LinePrinter prints freecell board sheets horiziontally, fitting as many
 # as possible within the terminal window before moving to the next row.
+# Normally the boards are held until flush. Streaming, a row is printed 
+# as soon as it's full, so only one row's worth of boards is held.
 
 class LinePrinter:
-    def __init__(self):
+    def __init__(self, streaming=False):
+        self.streaming = streaming
         self.rows, self.cols = get_terminal_size()
         self.current_block = Block()
         self.blocks = []
         self.header = []
 
+    def wants_board(self, final=False):
+        return not final
+
     def print_lines(self, lines):
         self.current_block.extend(lines)
 
     # Printing a sheet "finalizes" the block for printing, so only one
     # sheet can appear in a block.
     def print_sheet(self, sheet: PrinterSheet):
-        self.current_block.extend(sheet.get_lines())
+        self.current_block.extend(sheet.get_lines(), sheet.get_widths())
         self.end_block()
 
     def print_header(self, *args, **kwargs):
@@ -96,11 +288,19 @@ class LinePrinter:
 
     def end_block(self):
         # Insert the header as the first row:
-        self.current_block[0:0] = self.header or [''] # 'or' provide an empty header
+        self.current_block.insert_lines(self.header or ['']) # 'or' provide an empty header
         self.current_block.finalize()
         self.blocks.append(self.current_block)
         self.current_block = Block()
         self.header = []
+        if self.streaming:
+            self.print_full_rows()
+
+    # Print rows while there are blocks left over that wouldn't fit in them.
+    def print_full_rows(self):
+        while sum(i.cols + MARGIN for i in self.blocks) > self.cols:
+            self.belo_horizonte(self.get_blocks_that_fit())
+            sys.stdout.flush()
 
     def flush(self):
         while True:
@@ -115,7 +315,7 @@ class LinePrinter:
         while self.blocks:
             block_columns = self.blocks[0].cols + MARGIN
             free_columns -= block_columns
-            if free_columns < 0:
+            if free_columns < 0 and to_print: # a block too wide for the terminal gets a row alone
                 break
             to_print.append(self.blocks.pop(0))
         return to_print
@@ -0,0 +1,89 @@
+# Headless play-back of solved games, for verifying moves files in bulk.
+# Games are replayed exactly as freecell-game.py plays them back, but
+# nothing is printed, and games can be spread across a process pool.
+
+import time
+
+from freecell import Board, UserException
+
+# The outcome of replaying one game: completed is True if the board was
+# cleared, False if a move failed or the moves ran out, and None if the
+# moves quit the game. It also counts what the game did, including the
+# boards that playing it in freecell-game.py would print.
+
+class ReplayResult:
+    def __init__(self, seed):
+        self.seed = seed
+        self.completed = None
+        self.moves = 0 # user moves made
+        self.automoves = 0
+        self.boards = 1 # starting with the deal
+        self.failed_move = None # (the move's position in the moves, the move)
+        self.elapsed = 0
+
+# Play the moves on a new board, following each move with the automover's moves
+# (unless automoves is False). The moves may use the "u", "r" and "q" commands.
+
+def replay(seed, moves, freecells=4, cascades=8, ignore_dependencies=False, automoves=True):
+    start = time.perf_counter()
+    result = ReplayResult(seed)
+    board = Board(seed=seed, freecells=freecells, cascades=cascades,
+                  ignore_dependencies=ignore_dependencies)
+    result.completed = play_moves(board, moves, automoves, result)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+def play_moves(board, moves, automoves, result=None):
+    result = result or ReplayResult(None)
+
+    # Undo and redo print a board for every move they take back or repeat.
+    def count_board(board, move, at_checkpoint):
+        result.boards += 1
+
+    for number, move in enumerate(moves, 1):
+        if board.is_empty():
+            return True
+        move = move.strip()
+
+        if move == '':
+            continue
+        if move == 'q':
+            return None
+        if move == 'u':
+            board.undo(count_board)
+            continue
+        if move == 'r':
+            board.redo(count_board)
+            continue
+
+        try:
+            board.perform_move(move, make_checkpoint=True)
+        except UserException:
+            result.failed_move = (number, move)
+            return False
+        result.moves += 1
+        result.boards += 1
+
+        if automoves:
+            for move in board.automatic_moves():
+                board.perform_move(move, make_checkpoint=False)
+                result.automoves += 1
+                result.boards += 1
+
+    return board.is_empty()
+
+def replay_game(args):
+    seed, moves, settings = args
+    return replay(seed, moves, **settings)
+
+# Replay (seed, moves) pairs across a pool of processes (jobs=None uses one per CPU),
+# generating their results in the same order.
+
+def replay_games(games, jobs=None, **settings):
+    tasks = ((seed, moves, settings) for seed, moves in games)
+    if jobs == 1:
+        yield from map(replay_game, tasks)
+        return
+    from multiprocessing import Pool # which is slow to import, and only needed here
+    with Pool(jobs) as pool:
+        yield from pool.imap(replay_game, tasks, chunksize=8)
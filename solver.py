@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+# A best-first (weighted A*) Freecell solver built on the freecell.Board engine.
+# Solutions are lists of two character user moves, in the same format that
+# games.Games loads, so they can be appended to a moves file and played back.
+
+import getopt
+import heapq
+import sys
+import time
+
+from freecell import Board
+
+# Solver search results: the moves found (None if the search failed) and the
+# amount of work it took to find them.
+
+class Solution:
+    def __init__(self, seed, moves, nodes, elapsed):
+        self.seed = seed
+        self.moves = moves
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def is_solved(self):
+        return self.moves is not None
+
+    def get_nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed else 0
+
+    # Format the solution as a moves file entry (a header line followed by
+    # lines of 10 moves).
+    def as_moves_file_entry(self):
+        lines = [f'#{self.seed} solver, {len(self.moves)} moves']
+        for i in range(0, len(self.moves), 10):
+            lines.append(' '.join(self.moves[i:i+10]))
+        return '\n'.join(lines) + '\n'
+
+# The Solver expands board positions in order of their estimated distance from
+# a solution, remembering every position it has seen in a visited-state table.
+# Each user move is followed by the automover's moves, exactly as in play-back.
+# The search stops when it runs out of either its node or its time budget.
+
+class Solver:
+    G_weight = 0.5 # how much the move count so far counts against a position
+
+    def __init__(self, seed, freecells=4, cascades=8, ignore_dependencies=False,
+                 max_nodes=200000, max_seconds=60.0):
+        self.seed = seed
+        self.board = Board(seed=seed, freecells=freecells, cascades=cascades,
+                           ignore_dependencies=ignore_dependencies)
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+
+    def solve(self):
+        board = self.board
+        start = time.perf_counter()
+        deadline = start + self.max_seconds
+
+        # Play-back only runs the automover after user moves, so there's none here.
+        # Nodes are kept as (parent node index, move) pairs, from which the
+        # solution path gets rebuilt once the board has been cleared.
+        self.nodes = nodes = [(None, None)]
+        visited = {self.get_state_key()}
+        frontier = [(self.get_priority(0), 0, 0, self.get_position())]
+        expanded = 0
+        solution = None
+
+        while frontier and solution is None:
+            if expanded >= self.max_nodes or time.perf_counter() > deadline:
+                break
+
+            _, depth, node, position = heapq.heappop(frontier)
+            expanded += 1
+
+            self.set_position(position)
+            # All the moves are found before any are made, as the board mustn't change
+            # while they're generated.
+            for move_code in list(board.get_ordered_move_codes()):
+                token = board.apply(move_code)
+                automove_tokens = self.make_automatic_moves()
+
+                key = self.get_state_key()
+                if key not in visited:
+                    visited.add(key)
+                    nodes.append((node, board.get_move_string(move_code)))
+                    if board.is_empty():
+                        solution = self.get_path(len(nodes) - 1)
+                        break
+                    heapq.heappush(frontier, (self.get_priority(depth + 1), depth + 1,
+                                              len(nodes) - 1, self.get_position()))
+
+                # Take the moves back to try the next one from the same position.
+                for automove_token in reversed(automove_tokens):
+                    board.revert(automove_token)
+                board.revert(token)
+
+        return Solution(self.seed, solution, expanded, time.perf_counter() - start)
+
+    # Make the automover's moves, returning their tokens for taking them back.
+    def make_automatic_moves(self):
+        board = self.board
+        return [board.apply(board.get_move_code(move)) for move in board.automatic_moves()]
+
+    def get_path(self, node):
+        moves = []
+        while node:
+            node, move = self.nodes[node]
+            moves.append(move)
+        return moves[::-1]
+
+    # The estimated number of moves left to clear the board, plus the
+    # (weighted) number of moves it took to get here.
+    def get_priority(self, depth):
+        return self.get_heuristic() + Solver.G_weight * depth
+
+    # Cards that still have to go home are the main cost. Cards sitting above the
+    # next card each foundation needs have to be moved out of the way first, and
+    # occupied freecells and cascades make that harder.
+    def get_heuristic(self):
+        board = self.board
+        score = 0
+        # The homes are in suit order, so this is the rank each suit needs next.
+        needed = [len(home) for home in board.homes]
+        for home in board.homes:
+            score += 3 * (13 - len(home))
+        for cascade in board.cascades:
+            if not cascade:
+                score -= 2
+            for depth, card in enumerate(cascade):
+                if needed[card.number % 4] == card.rank_index:
+                    score += len(cascade) - depth - 1
+        score += sum(1 for free in board.frees if free)
+        return score
+
+    # Positions are kept as board snapshots, which are compact enough to hold
+    # hundreds of thousands of them.
+    def get_position(self):
+        return self.board.snapshot()
+
+    def set_position(self, position):
+        self.board.restore(position)
+
+    # Equivalent positions share a key: the board hash ignores the order of
+    # the freecells and of the cascades.
+    def get_state_key(self):
+        return self.board.hash
+
+def usage():
+    print(f'''\nusage: {sys.argv[0]} [options] game...
+
+Search for solutions to MS compatible Freecell deals and print them in moves file format.
+
+    Options:
+       -f or --freecells n - set number of freecells (default: 4)
+       -c or --cascades n - set number of cascades (default: 8)
+       -i or --ignore-dependencies - make the auto-mover ignore dependencies on other cards on the board
+       -n or --max-nodes n - give up on a game after expanding n positions (default: 200000)
+       -s or --max-seconds n - give up on a game after n seconds (default: 60)
+       -h or --help - print this help sheet
+''')
+    sys.exit(1)
+
+def main():
+    try:
+        optslist, args = getopt.getopt(sys.argv[1:], 'f:c:in:s:h',
+                ['freecells=', 'cascades=', 'ignore-dependencies', 'max-nodes=', 'max-seconds=', 'help'])
+    except getopt.GetoptError as err:
+        print(f'\n*** {err} ***\n')
+        usage()
+
+    settings = {}
+    for arg, val in optslist:
+        if arg in ('--freecells', '-f'):
+            settings['freecells'] = int(val)
+        elif arg in ('--cascades', '-c'):
+            settings['cascades'] = int(val)
+        elif arg in ('--ignore-dependencies', '-i'):
+            settings['ignore_dependencies'] = True
+        elif arg in ('--max-nodes', '-n'):
+            settings['max_nodes'] = int(val)
+        elif arg in ('--max-seconds', '-s'):
+            settings['max_seconds'] = float(val)
+        elif arg in ('--help', '-h'):
+            usage()
+
+    if not args:
+        usage()
+
+    total_nodes = total_time = 0
+    for seed in args:
+        solution = Solver(int(seed), **settings).solve()
+        total_nodes += solution.nodes
+        total_time += solution.elapsed
+        status = f'{len(solution.moves)} moves' if solution.is_solved() else 'no solution found'
+        print(f'Game #{solution.seed}: {status}, {solution.nodes} nodes in {solution.elapsed:.2f}s '
+              f'({solution.get_nodes_per_second():.0f} nodes/s)', file=sys.stderr)
+        if solution.is_solved():
+            print(solution.as_moves_file_entry())
+
+    if total_time:
+        print(f'Total: {total_nodes} nodes in {total_time:.2f}s ({total_nodes / total_time:.0f} nodes/s)',
+              file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# Call counts and cumulative times for the engine's methods (for freecell-game.py
+# --stats). The methods are wrapped in place, so nothing is counted, or slowed
+# down, until instrument is called.
+
+import functools
+import inspect
+import sys
+import time
+
+from freecell import Board
+from printers import TTY, LinePrinter, NullPrinter, SamplingPrinter, ScreenPrinter
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0
+
+Counters = {} # "Class.method" -> Counter
+
+# The time spent in a generator (such as Board.automatic_moves) is that spent
+# producing its values, leaving out the time its caller takes between them.
+
+def instrument(cls, name):
+    function = getattr(cls, name)
+    counter = Counters[f'{cls.__name__}.{name}'] = Counter()
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counter.calls += 1
+            generator = function(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    value = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    counter.seconds += time.perf_counter() - start
+                yield value
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counter.calls += 1
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counter.seconds += time.perf_counter() - start
+
+    setattr(cls, name, wrapper)
+
+# The phases of a game: moving, finding moves, the automover, and printing.
+
+def instrument_game():
+    for name in ('perform_move', 'get_possible_moves', 'automatic_moves', 'card_is_safe_to_move', 'print'):
+        instrument(Board, name)
+    for printer in (TTY, LinePrinter, ScreenPrinter, SamplingPrinter, NullPrinter):
+        instrument(printer, 'flush')
+
+# Print the counters that were called, the most time consuming first. The times 
+# are cumulative, so those of methods called by others are counted in both.
+
+def report(file=sys.stderr):
+    print(f'\n{"method":32} {"calls":>9} {"total ms":>10} {"us/call":>9}', file=file)
+    for name, counter in sorted(Counters.items(), key=lambda i: i[1].seconds, reverse=True):
+        if counter.calls:
+            print(f'{name:32} {counter.calls:9} {counter.seconds * 1e3:10.1f} '
+                  f'{counter.seconds / counter.calls * 1e6:9.2f}', file=file)